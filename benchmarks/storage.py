@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Size and speed of the storage profiles
+
+Writes the same synthetic ticks with every profile, then measures the file
+size and the time to read all the securities back through the resampler
+loaders, and the same for the resampled bar files.
+
+    $ PYTHONPATH=. python benchmarks/storage.py --securities 200 --ticks 2000
+"""
+import os
+import tempfile
+import time
+
+import click
+import numpy as np
+import tables
+
+from jpxlab.converter import _TickWriter
+from jpxlab.resampler import _extract_prices, _extract_volumes, resample
+from jpxlab.storage import PROFILES, StorageProfile
+
+
+# bars of the original resampler: HDFStore(complevel=9), i.e. zlib
+BASELINE_BARS = StorageProfile("zlib", 9, True, False)
+
+VARIANTS = [
+    # the original converter: uncompressed 2-D EArrays, one row per tick
+    ("earray", None),
+    # raw columns in a table, uncompressed
+    ("none", PROFILES["none"]),
+    # raw layout with the filter the bar files used to have
+    ("raw+zlib9", StorageProfile("zlib", 9, False, False)),
+    ("zlib", PROFILES["zlib"]),
+    ("lz4", PROFILES["lz4"]),
+    ("zstd", PROFILES["zstd"]),
+]
+
+
+def _generate(securities: int, ticks: int, seed: int = 0):
+    """Yield (key, price rows, volume rows) for synthetic securities"""
+
+    rng = np.random.RandomState(seed)
+    start = 1574208000 * 1000000 + 9 * 3600 * 1000000
+
+    for i in range(securities):
+        times = start + np.cumsum(rng.randint(1, 5000000, size=ticks))
+        level = rng.randint(100, 50000)
+        prices = level * 10 + np.cumsum(rng.randint(-5, 6, size=ticks))
+        volumes = np.cumsum(rng.randint(1, 100, size=ticks) * 100)
+
+        price_rows = [(int(t), int(p) * 1000, 4) for t, p in zip(times, prices)]
+        volume_rows = [
+            (int(t) // 1000000 * 1000000, int(v)) for t, v in zip(times, volumes)
+        ]
+
+        yield ("1", str(1000 + i)), price_rows, volume_rows
+
+
+def _write(path: str, profile: StorageProfile, data: list) -> float:
+
+    begin = time.perf_counter()
+    with tables.open_file(path, mode="w") as store:
+        out_price = _TickWriter(store, "/price", profile)
+        out_volume = _TickWriter(store, "/volume", profile)
+        for key, price_rows, volume_rows in data:
+            name = "t" + key[1]
+            for row in price_rows:
+                out_price.append(key, name, row)
+            for row in volume_rows:
+                out_volume.append(key, name, row)
+        out_price.close()
+        out_volume.close()
+    return time.perf_counter() - begin
+
+
+def _write_earray(path: str, data: list) -> float:
+    """Write the ticks as the original converter did"""
+
+    begin = time.perf_counter()
+    with tables.open_file(path, mode="w") as store:
+        for key, price_rows, volume_rows in data:
+            name = "t" + key[1]
+            for where, rows in (("/price", price_rows), ("/volume", volume_rows)):
+                node = store.create_earray(
+                    where, name, obj=[list(rows[0])], createparents=True
+                )
+                for row in rows[1:]:
+                    node.append([list(row)])
+    return time.perf_counter() - begin
+
+
+def _read(path: str) -> float:
+
+    begin = time.perf_counter()
+    with tables.open_file(path, mode="r") as store:
+        for node in store.list_nodes("/price"):
+            _extract_prices(node)
+            _extract_volumes(
+                store.get_node(node._v_pathname.replace("price", "volume"))
+            )
+    return time.perf_counter() - begin
+
+
+@click.command()
+@click.option("--securities", default=100, help="number of securities")
+@click.option("--ticks", default=2000, help="number of ticks per security")
+@click.option("--freq", default="1min", help="frequency of the bar files")
+def main(securities, ticks, freq):
+
+    data = list(_generate(securities, ticks))
+
+    print(
+        "{:<10} {:>12} {:>10} {:>10} {:>12} {:>10}".format(
+            "profile", "ticks [MB]", "write [s]", "read [s]", "bars [MB]", "bars [s]"
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, profile in VARIANTS:
+            path = os.path.join(workdir, "{}.h5".format(label))
+            outpath = os.path.join(workdir, "{}_{}.h5".format(label, freq))
+
+            if profile is None:
+                # read back through the legacy array path of _read_ticks
+                write_time = _write_earray(path, data)
+                bars_profile = BASELINE_BARS
+            else:
+                write_time = _write(path, profile, data)
+                bars_profile = profile
+            read_time = _read(path)
+
+            begin = time.perf_counter()
+            resample(path, outpath, freq, profile=bars_profile)
+            bars_time = time.perf_counter() - begin
+
+            print(
+                "{:<10} {:>12.2f} {:>10.2f} {:>10.3f} {:>12.2f} {:>10.2f}".format(
+                    label,
+                    os.path.getsize(path) / 2 ** 20,
+                    write_time,
+                    read_time,
+                    os.path.getsize(outpath) / 2 ** 20,
+                    bars_time,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,34 @@
 # -*- coding: utf-8 -*-
 
-"""Top-level package for jpxlab."""
+"""Top-level package for jpxlab.
+
+The public functions import their module when they are called, so that
+`import jpxlab` and the command line stay cheap and a worker only imports
+the dependencies of the code path it actually runs.
+"""
 
 __author__ = """Yuki Hayashi"""
 __email__ = "yuki@alpaca.ai"
 __version__ = "0.1.0"
+
+__all__ = ["fetch_and_convert", "resample"]
+
+
+def fetch_and_convert(*args, **kwargs):
+    """Fetch an archive and convert it into h5
+
+    See `jpxlab.converter.fetch_and_convert`.
+    """
+    from .converter import fetch_and_convert
+
+    return fetch_and_convert(*args, **kwargs)
+
+
+def resample(*args, **kwargs):
+    """Resample raw h5 file
+
+    See `jpxlab.resampler.resample`.
+    """
+    from .resampler import resample
+
+    return resample(*args, **kwargs)
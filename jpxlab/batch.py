@@ -0,0 +1,529 @@
+# -*- coding: utf-8 -*-
+
+"""Batch processing over a work queue kept on a shared directory
+
+Several hosts (or processes) mounting the same directory can work on one
+backfill without any queue service. The queue directory holds
+
+    tasks/<id>.json       task specs, written once by `submit`
+    leases/<id>.json      claimed tasks; the owner touches it as heartbeat
+    requeued/<id>/<uuid>  one marker per lease taken back from a dead worker
+    results/<id>.json     outcome and metrics of finished tasks
+    summary.json          merged results, written by `merge`
+
+A task is claimed by creating its lease with `O_CREAT | O_EXCL`, and every
+file is written to a temporary name then renamed, so that readers never see
+partial files. A lease whose heartbeat is older than `lease_timeout` is
+removed by any worker (under a `<lease>.reap` lock), which makes the task
+claimable again.
+
+The previous owner of a lease taken back may still be running. The tasks
+therefore write their outputs next to their first argument, to staging
+files named after the stage recorded in the lease. The worker renames them
+into place only if it still owns the lease when the task ends; otherwise
+they are discarded together with the result. The staging files of a worker
+which died are removed when its lease is reaped.
+
+The queue directory is shared, so a worker only runs the kinds of `TASKS`
+and never a function named by a task file.
+
+Only the standard library is imported here; the task functions are
+resolved when a task runs.
+"""
+import contextlib
+import glob
+import hashlib
+import importlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+
+from .storage import DEFAULT_PROFILE
+
+
+# Task kinds and their functions ("module:function"); a task function takes
+# a `stage` keyword and returns {name: output path} (see `_staged`)
+TASKS = {
+    "convert": "jpxlab.batch:convert_file",
+    "resample": "jpxlab.batch:resample_file",
+    "convert_resample": "jpxlab.batch:convert_and_resample",
+}
+
+_DIRS = ("tasks", "leases", "requeued", "results")
+
+
+def _staged(path: str, stage: str) -> str:
+    """Staging file of an output (the output itself without a stage)"""
+    if stage is None:
+        return path
+    return "{}.{}.partial".format(path, stage)
+
+
+def _discard(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def convert_file(src: str, profile: str = DEFAULT_PROFILE, stage: str = None) -> dict:
+    """Convert a raw archive next to it, as `jpxlab convert` does
+
+    Returns:
+        {"raw": path of the converted file}
+    """
+    from .converter import _get_outpath, fetch_and_convert
+
+    raw = _get_outpath(src, "")
+    try:
+        fetch_and_convert(src, profile=profile, outpath=_staged(raw, stage))
+    except BaseException:
+        _discard([_staged(raw, stage)])
+        raise
+
+    return {"raw": raw}
+
+
+def resample_file(
+    src: str, freq: str, profile: str = DEFAULT_PROFILE, stage: str = None
+) -> dict:
+    """Resample a converted file next to it, as `jpxlab resample` does
+
+    Returns:
+        {"bars": path of the bar file}
+    """
+    from .resampler import resample
+
+    bars = src.replace(".h5", "_{}.h5".format(freq))
+    try:
+        resample(src, _staged(bars, stage), freq, profile)
+    except BaseException:
+        _discard([_staged(bars, stage)])
+        raise
+
+    return {"bars": bars}
+
+
+def convert_and_resample(
+    src: str, freq: str, profile: str = DEFAULT_PROFILE, stage: str = None
+) -> dict:
+    """Convert a raw archive and resample the converted file
+
+    Returns:
+        {"raw": path of the converted file, "bars": path of the bar file}
+    """
+    from .converter import _get_outpath, fetch_and_convert
+    from .resampler import resample
+
+    raw = _get_outpath(src, "")
+    bars = raw.replace(".h5", "_{}.h5".format(freq))
+    try:
+        fetch_and_convert(src, profile=profile, outpath=_staged(raw, stage))
+        resample(_staged(raw, stage), _staged(bars, stage), freq, profile)
+    except BaseException:
+        _discard([_staged(raw, stage), _staged(bars, stage)])
+        raise
+
+    return {"raw": raw, "bars": bars}
+
+
+def _resolve(kind: str):
+    """Resolve a task kind (name in `TASKS`)"""
+    if kind not in TASKS:
+        raise ValueError("Unknown task kind", kind)
+    module, name = TASKS[kind].split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _path(queue: str, sub: str, task_id: str) -> str:
+    return os.path.join(queue, sub, "{}.json".format(task_id))
+
+
+def _write_json(path: str, obj):
+    """Write `obj` to `path` atomically"""
+    tmp = os.path.join(
+        os.path.dirname(path),
+        ".{}.{}.tmp".format(os.path.basename(path), uuid.uuid4().hex),
+    )
+    with open(tmp, "w") as f:
+        json.dump(obj, f, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str):
+    """Read a json file, None if it is gone"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _list_ids(queue: str, sub: str) -> list:
+    return sorted(
+        os.path.basename(p)[: -len(".json")]
+        for p in glob.glob(os.path.join(queue, sub, "*.json"))
+    )
+
+
+def _worker_id() -> str:
+    return "{}-{}".format(socket.gethostname(), os.getpid())
+
+
+def _task_id(kind: str, item, kwargs: dict) -> str:
+    """Id of a task: readable prefix and a hash of the whole spec"""
+
+    spec = json.dumps([kind, item, kwargs], sort_keys=True)
+    digest = hashlib.sha1(spec.encode("utf-8")).hexdigest()[:12]
+    name = "{}-{}".format(kind, os.path.basename(str(item)))
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+    return "{}-{}".format(name, digest)
+
+
+def init_queue(queue: str):
+    """Create the directories of a queue"""
+    for sub in _DIRS:
+        os.makedirs(os.path.join(queue, sub), exist_ok=True)
+
+
+def submit(queue: str, kind: str, items: list, **kwargs) -> list:
+    """Add one task per item to the queue
+
+    Tasks are identified by their kind, item and keyword arguments, so
+    submitting the same items again is a no-op and a backfill can be
+    extended or resubmitted safely, while the same files with other
+    arguments (e.g. another `freq`) make new tasks.
+
+    Args:
+        queue  (str)  : queue directory
+        kind   (str)  : task kind (see `TASKS`)
+        items  (list) : first argument of each task, typically a file path
+        kwargs        : keyword arguments shared by the tasks
+    Returns:
+        ids of the tasks
+    """
+
+    _resolve(kind)
+    init_queue(queue)
+
+    ids = []
+    for item in items:
+        task_id = _task_id(kind, item, kwargs)
+        path = _path(queue, "tasks", task_id)
+        if not os.path.exists(path):
+            _write_json(
+                path, {"id": task_id, "kind": kind, "args": [item], "kwargs": kwargs}
+            )
+        ids.append(task_id)
+
+    return ids
+
+
+def _claim(queue: str, task_id: str, worker: str, stage: str = None) -> bool:
+    """Create the lease of a task, False if it is already taken"""
+    try:
+        fd = os.open(
+            _path(queue, "leases", task_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY
+        )
+    except FileExistsError:
+        return False
+
+    with os.fdopen(fd, "w") as f:
+        json.dump({"worker": worker, "claimed": time.time(), "stage": stage}, f)
+
+    return True
+
+
+def _owns(queue: str, task_id: str, worker: str) -> bool:
+    try:
+        lease = _read_json(_path(queue, "leases", task_id))
+    except ValueError:
+        # being written by another worker
+        return False
+    return lease is not None and lease["worker"] == worker
+
+
+def _requeues(queue: str, task_id: str) -> int:
+    try:
+        return len(os.listdir(os.path.join(queue, "requeued", task_id)))
+    except FileNotFoundError:
+        return 0
+
+
+def _reap(queue: str, lease_timeout: float, worker: str) -> list:
+    """Take back the leases whose heartbeat stopped
+
+    Returns:
+        ids of the requeued tasks
+    """
+
+    requeued = []
+
+    for task_id in _list_ids(queue, "leases"):
+        path = _path(queue, "leases", task_id)
+        if not _expired(path, lease_timeout):
+            continue
+
+        # only one worker at a time checks and removes a lease
+        lock = path + ".reap"
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            if _expired(lock, lease_timeout):
+                # left behind by a worker which died while reaping
+                _discard([lock])
+            continue
+
+        try:
+            expired = _expired(path, lease_timeout)
+            if expired:
+                lease = _read_json(path)
+                _discard([path])
+                if lease is not None and lease.get("stage"):
+                    task = _read_json(_path(queue, "tasks", task_id))
+                    _discard(_staged_files(task, lease["stage"]))
+        finally:
+            os.unlink(lock)
+
+        if not expired:
+            continue
+
+        markers = os.path.join(queue, "requeued", task_id)
+        os.makedirs(markers, exist_ok=True)
+        with open(os.path.join(markers, uuid.uuid4().hex), "w") as f:
+            f.write(worker)
+        requeued.append(task_id)
+
+    return requeued
+
+
+def _staged_files(task: dict, stage: str) -> list:
+    """Staging files written by a run of `task`"""
+    folder = os.path.dirname(os.path.abspath(str(task["args"][0])))
+    return glob.glob(os.path.join(glob.escape(folder), "*.{}.partial".format(stage)))
+
+
+def _expired(path: str, lease_timeout: float) -> bool:
+    """True if `path` was not touched for `lease_timeout` seconds"""
+    try:
+        return time.time() - os.stat(path).st_mtime >= lease_timeout
+    except FileNotFoundError:
+        return False
+
+
+def _heartbeat(
+    queue: str,
+    task_id: str,
+    worker: str,
+    interval: float,
+    stop: threading.Event,
+    lost: threading.Event,
+):
+    path = _path(queue, "leases", task_id)
+    while not stop.wait(interval):
+        if not _owns(queue, task_id, worker):
+            # the lease was taken back, the outputs will be discarded
+            lost.set()
+            return
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            lost.set()
+            return
+
+
+@contextlib.contextmanager
+def _keep_alive(queue: str, task_id: str, worker: str, interval: float):
+    """Send the heartbeats of a lease while the block runs
+
+    Yields:
+        event set if the lease was taken back
+    """
+
+    stop = threading.Event()
+    lost = threading.Event()
+    beat = threading.Thread(
+        target=_heartbeat,
+        args=(queue, task_id, worker, interval, stop, lost),
+        daemon=True,
+    )
+    beat.start()
+    try:
+        yield lost
+    finally:
+        stop.set()
+        beat.join()
+
+
+def _run(queue: str, task: dict, worker: str, stage: str) -> dict:
+    """Run a claimed task, writing its outputs to the staging files"""
+
+    started = time.time()
+    result = {"id": task["id"], "kind": task["kind"], "worker": worker}
+    try:
+        function = _resolve(task["kind"])
+        result["value"] = function(*task["args"], stage=stage, **task["kwargs"])
+        result["outputs"] = sorted(result["value"].values())
+        result["status"] = "done"
+    except Exception as e:
+        result["error"] = repr(e)
+        result["status"] = "failed"
+
+    finished = time.time()
+    result["metrics"] = {
+        "started": started,
+        "finished": finished,
+        "elapsed": finished - started,
+        "attempt": _requeues(queue, task["id"]) + 1,
+    }
+
+    return result
+
+
+def _commit(queue: str, result: dict, worker: str, stage: str, lost: bool) -> bool:
+    """Move the staged outputs into place and record the result
+
+    Nothing is kept if the lease was taken back in the meantime. The
+    heartbeats must go on until this returns.
+
+    Returns:
+        True if the result was recorded
+    """
+
+    task_id = result["id"]
+    outputs = result.get("outputs", [])
+
+    if lost or not _owns(queue, task_id, worker):
+        _discard(_staged(path, stage) for path in outputs)
+        return False
+
+    for path in outputs:
+        os.replace(_staged(path, stage), path)
+    _write_json(_path(queue, "results", task_id), result)
+    # never remove a lease claimed again by another worker
+    if _owns(queue, task_id, worker):
+        _discard([_path(queue, "leases", task_id)])
+
+    return True
+
+
+def work(
+    queue: str,
+    worker: str = None,
+    lease_timeout: float = 300.0,
+    heartbeat: float = 30.0,
+    poll: float = 5.0,
+    max_requeues: int = 3,
+) -> int:
+    """Process tasks of the queue until every task has a result
+
+    The worker keeps polling while other workers hold leases, so that it
+    picks up the tasks of a worker which died.
+
+    Args:
+        queue         (str)   : queue directory
+        worker        (str)   : name of the worker (host-pid by default)
+        lease_timeout (float) : seconds without heartbeat before requeueing
+        heartbeat     (float) : seconds between two heartbeats
+        poll          (float) : seconds to wait when nothing can be claimed
+        max_requeues  (int)   : requeues before a task is given up
+    Returns:
+        number of tasks processed by this worker
+    """
+
+    if heartbeat >= lease_timeout:
+        raise ValueError("heartbeat must be shorter than lease_timeout", heartbeat)
+
+    worker = worker or _worker_id()
+    init_queue(queue)
+
+    processed = 0
+    while True:
+        _reap(queue, lease_timeout, worker)
+
+        done = set(_list_ids(queue, "results"))
+        pending = [t for t in _list_ids(queue, "tasks") if t not in done]
+        if not pending:
+            return processed
+
+        claimed = None
+        stage = uuid.uuid4().hex
+        for task_id in pending:
+            if _claim(queue, task_id, worker, stage):
+                claimed = task_id
+                break
+
+        if claimed is None:
+            time.sleep(poll)
+            continue
+
+        if os.path.exists(_path(queue, "results", claimed)):
+            # finished between the listing and the claim
+            os.unlink(_path(queue, "leases", claimed))
+            continue
+
+        task = _read_json(_path(queue, "tasks", claimed))
+        with _keep_alive(queue, claimed, worker, heartbeat) as lost:
+            if _requeues(queue, claimed) >= max_requeues:
+                result = {
+                    "id": claimed,
+                    "kind": task["kind"],
+                    "worker": worker,
+                    "status": "failed",
+                    "error": "abandoned after {} requeues".format(max_requeues),
+                }
+            else:
+                result = _run(queue, task, worker, stage)
+
+            if _commit(queue, result, worker, stage, lost.is_set()):
+                processed += 1
+
+
+def merge(queue: str) -> dict:
+    """Merge the results and the metrics of the queue into `summary.json`
+
+    Returns:
+        {
+            "tasks": number of tasks, "done": ..., "failed": ...,
+            "running": ..., "pending": ...,
+            "elapsed": total seconds spent in tasks,
+            "workers": {worker: {"tasks": ..., "elapsed": ...}},
+            "results": {id: result},
+        }
+    """
+
+    tasks = _list_ids(queue, "tasks")
+    leases = set(_list_ids(queue, "leases"))
+
+    results = dict()
+    for task_id in _list_ids(queue, "results"):
+        result = _read_json(_path(queue, "results", task_id))
+        if result is not None:
+            results[task_id] = result
+
+    workers = dict()
+    for result in results.values():
+        stats = workers.setdefault(result["worker"], {"tasks": 0, "elapsed": 0.0})
+        stats["tasks"] += 1
+        stats["elapsed"] += result.get("metrics", {}).get("elapsed", 0.0)
+
+    summary = {
+        "tasks": len(tasks),
+        "done": sum(r["status"] == "done" for r in results.values()),
+        "failed": sum(r["status"] == "failed" for r in results.values()),
+        "running": len([t for t in tasks if t in leases and t not in results]),
+        "pending": len([t for t in tasks if t not in leases and t not in results]),
+        "elapsed": sum(w["elapsed"] for w in workers.values()),
+        "workers": workers,
+        "results": results,
+    }
+
+    _write_json(os.path.join(queue, "summary.json"), summary)
+
+    return summary
@@ -1,11 +1,27 @@
 # -*- coding: utf-8 -*-
 
-"""Console script for jpxlab."""
-from joblib import Parallel, delayed
+"""Console script for jpxlab.
+
+Heavy dependencies (joblib, pandas, PyTables, ...) are imported inside the
+commands, so `--help` and argument errors return immediately.
+"""
 import click
-import jpxlab
+import json
 import sys
 
+from jpxlab.batch import TASKS
+from jpxlab.storage import DEFAULT_PROFILE, PROFILES
+
+profile_option = click.option(
+    "-p",
+    "--profile",
+    "profile",
+    type=click.Choice(sorted(PROFILES)),
+    default=DEFAULT_PROFILE,
+    show_default=True,
+    help="storage profile (compression and layout) of the output",
+)
+
 
 @click.group()
 def cmd():
@@ -14,12 +30,15 @@ def cmd():
 
 @cmd.command()
 @click.option("-f", "--freq", "freq", type=str, help="frequency of resampling")
+@profile_option
 @click.argument("files", nargs=-1, type=click.Path())
-def resample(freq, files):
+def resample(freq, profile, files):
     """resample the h5 file into aggregated dataframe"""
+    from joblib import Parallel, delayed
+    from jpxlab.resampler import resample
 
     Parallel(n_jobs=-1)(
-        delayed(jpxlab.resample)(f, f.replace(".h5", "_{}.h5".format(freq)), freq)
+        delayed(resample)(f, f.replace(".h5", "_{}.h5".format(freq)), freq, profile)
         for f in files
     )
 
@@ -27,14 +46,116 @@ def resample(freq, files):
 
 
 @cmd.command()
+@profile_option
 @click.argument("files", nargs=-1, type=click.Path())
-def convert(files):
+def convert(profile, files):
     """convert raw zip files to h5"""
+    from joblib import Parallel, delayed
+    from jpxlab.converter import fetch_and_convert
+
+    Parallel(n_jobs=-1)(delayed(fetch_and_convert)(f, profile=profile) for f in files)
+
+    return 0
+
+
+@cmd.command()
+@click.argument("files", nargs=-1, type=click.Path(exists=True))
+def quality(files):
+    """print the data-quality summary of converted h5 files (one json per line)"""
+    from jpxlab.quality import read_quality
 
-    Parallel(n_jobs=-1)(delayed(jpxlab.fetch_and_convert)(f) for f in files)
+    for f in files:
+        summary = read_quality(f)["summary"]
+        summary["file"] = f
+        click.echo(json.dumps(summary, sort_keys=True))
 
     return 0
 
 
+@cmd.group()
+def batch():
+    """process files over a work queue on a shared directory"""
+    pass
+
+
+@batch.command()
+@click.option(
+    "-k",
+    "--kind",
+    "kind",
+    type=click.Choice(sorted(TASKS)),
+    default="convert_resample",
+    show_default=True,
+    help="task to run on each file",
+)
+@click.option("-f", "--freq", "freq", type=str, help="frequency of resampling")
+@profile_option
+@click.argument("queue", type=click.Path())
+@click.argument("files", nargs=-1, type=click.Path())
+def submit(kind, freq, profile, queue, files):
+    """add one task per file to the queue"""
+    from jpxlab.batch import submit
+
+    kwargs = {"profile": profile}
+    if kind != "convert":
+        if freq is None:
+            raise click.UsageError("--freq is required to resample")
+        kwargs["freq"] = freq
+
+    ids = submit(queue, kind, list(files), **kwargs)
+    click.echo("{} tasks in {}".format(len(ids), queue))
+
+    return 0
+
+
+@batch.command()
+@click.option(
+    "-j", "--jobs", "jobs", default=1, show_default=True, help="local workers"
+)
+@click.option(
+    "--lease-timeout",
+    default=300.0,
+    show_default=True,
+    help="seconds without heartbeat before a task is requeued",
+)
+@click.option(
+    "--heartbeat", default=30.0, show_default=True, help="seconds between heartbeats"
+)
+@click.option(
+    "--poll", default=5.0, show_default=True, help="seconds between two polls"
+)
+@click.argument("queue", type=click.Path())
+def work(jobs, lease_timeout, heartbeat, poll, queue):
+    """process tasks of the queue until all of them are finished"""
+    from joblib import Parallel, delayed
+    from jpxlab.batch import work
+
+    Parallel(n_jobs=jobs)(
+        delayed(work)(
+            queue, lease_timeout=lease_timeout, heartbeat=heartbeat, poll=poll
+        )
+        for _ in range(jobs)
+    )
+
+    return 0
+
+
+@batch.command()
+@click.argument("queue", type=click.Path())
+def merge(queue):
+    """merge results and metrics of the queue into summary.json"""
+    from jpxlab.batch import merge
+
+    summary = merge(queue)
+    summary.pop("results")
+    click.echo(json.dumps(summary, indent=2, sort_keys=True))
+
+    return 0
+
+
+def main():
+    return cmd()
+
+
 if __name__ == "__main__":
-    sys.exit(cmd())
+    sys.exit(main())
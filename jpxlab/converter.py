@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""Convert raw FLEX Historical archives into h5"""
+from zipfile import ZipFile
+import datetime
+import gzip
+import numpy as np
+import os
+import tables
+from io import BytesIO
+from collections import Counter
+from tqdm import tqdm
+
+from .flex import _load_chunk, _parse_chunk, _get_security_code
+from .quality import TAG_COUNTERS, _TickQuality, _set_attrs
+from .storage import (
+    DEFAULT_PROFILE,
+    PROFILES,
+    StorageProfile,
+    _get_description,
+    _get_filters,
+    get_profile,
+)
+
+
+class _TickWriter:
+    """Append ticks of each security into its own table under `where`
+
+    Tables are laid out according to the storage profile. With an encoded
+    profile the rows are `(time delta, value)` and, for prices, the value is
+    an integer in the `price_scale` decimals of the table. Otherwise the rows
+    are written as they come out of the parser.
+
+    The data-quality counters of each table (see `jpxlab.quality`) are
+    updated on the way and stored as attributes by `flush` (or `close`).
+    """
+
+    def __init__(
+        self, store: tables.File, where: str, profile: StorageProfile, origin: int = 0
+    ):
+        self.store = store
+        self.where = where
+        self.profile = profile
+        self.origin = origin
+        self.filters = _get_filters(profile)
+        self.description = np.dtype(_get_description(where, profile))
+        self.nodes = dict()
+        self.rows = dict()
+        self.quality = dict()
+        self.last_time = dict()
+        self.scales = dict()
+
+    def _rescale(self, key, flag: int):
+        """Raise the decimal scale of a table to `flag` decimals"""
+        node = self.nodes[key]
+        node.flush()
+        node.modify_column(
+            column=node.col("price") * 10 ** (flag - self.scales[key]),
+            colname="price",
+        )
+        node.attrs.price_scale = flag
+        self.scales[key] = flag
+
+    def _encode(self, key, row: tuple) -> tuple:
+
+        time, value = row[0], row[1]
+
+        delta = time - self.last_time.get(key, 0)
+        self.last_time[key] = time
+
+        if len(row) > 2:
+            flag = row[2]
+            if key not in self.scales:
+                self.scales[key] = flag
+            elif flag > self.scales[key]:
+                self._rescale(key, flag)
+            value *= 10 ** (self.scales[key] - flag)
+
+        return (delta, value)
+
+    def _create(self, key, name: str):
+
+        node = self.store.create_table(
+            self.where,
+            name,
+            description=self.description,
+            filters=self.filters,
+            createparents=True,
+        )
+        if self.profile.encoded:
+            node.attrs.time_encoding = "delta"
+            if key in self.scales:
+                node.attrs.price_scale = self.scales[key]
+
+        self.nodes[key] = node
+        self.rows[key] = node.row
+        self.quality[key] = _TickQuality(self.origin)
+
+    def append(self, key, name: str, row: tuple):
+
+        encoded = self._encode(key, row) if self.profile.encoded else row
+
+        if key not in self.nodes:
+            self._create(key, name)
+
+        self.quality[key].add(row[0])
+
+        out = self.rows[key]
+        for column, value in zip(self.description.names, encoded):
+            out[column] = value
+        out.append()
+
+    def flush(self) -> Counter:
+        """Flush the tables and store their counters
+
+        Returns:
+            totals of the counters over the tables
+        """
+
+        totals = Counter()
+        for key, node in self.nodes.items():
+            node.flush()
+            counters = self.quality[key].summary()
+            _set_attrs(node.attrs, counters)
+            totals.update(
+                {
+                    "ticks": counters["ticks"],
+                    "out_of_order": counters["out_of_order"],
+                    "gaps": counters["gaps"],
+                    "out_of_order_nodes": int(counters["out_of_order"] > 0),
+                }
+            )
+        return totals
+
+    def close(self) -> Counter:
+        """Flush the tables, store their counters and release the tables
+
+        The writer holds the tables and their row buffers, which must be
+        released before the file is closed.
+
+        Returns:
+            totals of the counters over the tables
+        """
+
+        totals = self.flush()
+        self.nodes.clear()
+        self.rows.clear()
+        return totals
+
+
+def _dump_to_h5(
+    stream: BytesIO,
+    store: tables.File,
+    file_size: int,
+    date: datetime.date,
+    profile: StorageProfile = PROFILES[DEFAULT_PROFILE],
+):
+    """Convert and dump to h5
+    Args:
+        stream (InputStream)     : input stream
+        store (tables.File)      : pytable output
+        file_size (int)          : size of the file
+        date (date)              : date of the file
+        profile (StorageProfile) : layout and filters of the nodes
+    """
+
+    date_offset_epoch = datetime.datetime.fromordinal(date.toordinal()).timestamp()
+    origin = int(date_offset_epoch) * 1000000
+
+    out_price = _TickWriter(store, "/price", profile, origin)
+    out_volume = _TickWriter(store, "/volume", profile, origin)
+
+    # counters of the tags, per security and for the whole file
+    quality = dict()
+    totals = Counter(dict.fromkeys(TAG_COUNTERS + ("unknown_exchange",), 0))
+
+    with tqdm(
+        total=file_size, desc="Streaming", unit="B", unit_scale=1, ncols=100
+    ) as pbar:
+        while True:
+
+            chunk = _load_chunk(stream)
+            if chunk is None:
+                break
+
+            payload, exchange, session, category, security, chunk_size = chunk
+            key = (exchange, security)
+            pbar.update(chunk_size)
+            totals["chunks"] += 1
+
+            try:
+                name = _get_security_code(exchange, security)
+            except ValueError:
+                totals["unknown_exchange"] += 1
+                continue
+
+            if key not in quality:
+                quality[key] = Counter(dict.fromkeys(TAG_COUNTERS, 0))
+            counters = quality[key]
+            counters["chunks"] += 1
+
+            tags = Counter()
+            for typ, row in _parse_chunk(payload, date_offset_epoch, counters):
+
+                tags[typ] += 1
+                if typ == b"4P":
+                    out_price.append(key, name, row)
+
+                elif typ == b"VL":
+                    out_volume.append(key, name, row)
+
+            if tags[b"4P"] > 0 and tags[b"VL"] == 0:
+                counters["missing_vl"] += 1
+
+    # store the counters of the tags with the prices (or the volumes)
+    for key, counters in quality.items():
+        node = out_price.nodes.get(key, out_volume.nodes.get(key))
+        if node is not None:
+            _set_attrs(node.attrs, counters)
+        # chunks are already counted for the whole file
+        totals.update({k: v for k, v in counters.items() if k != "chunks"})
+
+    price_totals = out_price.close()
+    volume_totals = out_volume.close()
+
+    summary = dict(totals)
+    summary["securities"] = len(quality)
+    for prefix, counters in (("price_", price_totals), ("volume_", volume_totals)):
+        for name, value in counters.items():
+            summary[prefix + name] = value
+    _set_attrs(store.root._v_attrs, summary)
+
+
+def _get_outpath(src: str, suffix: str) -> str:
+    if src.endswith(".zip"):
+        return os.path.join(
+            os.path.dirname(src),
+            os.path.basename(src).replace(".zip", "{}.h5").format(suffix),
+        )
+    elif src.endswith(".gz"):
+        return os.path.join(
+            os.path.dirname(src),
+            os.path.basename(src).replace(".gz", "{}.h5").format(suffix),
+        )
+    else:
+        raise ValueError("Unsupported suffix: {}".format(src))
+
+
+def _convert_and_store(z, outpath, file_size, date, profile):
+
+    with tables.open_file(outpath, mode="w") as store:
+        _dump_to_h5(z, store, file_size, date, profile)
+
+
+def _stream_convert(
+    stream, outpath: str, mode: str, date: str, profile: StorageProfile
+):
+
+    assert mode in ("zip", "gz")
+
+    if mode == "zip":
+        zip_file = ZipFile(stream, allowZip64=True)
+
+        # Hack to workaround the broken file size in the header
+        file_size = zip_file.getinfo(zip_file.namelist()[0]).file_size
+        if file_size < 2 ** 33:
+            zip_file.getinfo(zip_file.namelist()[0]).file_size = 2 ** 64 - 1
+            file_size = 0
+
+        # Open the first compressed file
+        # (Only expecting one file inside the ZIP)
+        with zip_file.open(zip_file.namelist()[0]) as z:
+            _convert_and_store(z, outpath, file_size, date, profile)
+
+    elif mode == "gz":
+        with gzip.open(stream) as z:
+            _convert_and_store(z, outpath, 0, date, profile)
+
+
+def _extract_date(filename: str):
+    return datetime.datetime.strptime(
+        os.path.basename(filename), "StandardEquities_%Y%m%d.zip"
+    )
+
+
+def fetch_and_convert(
+    src: str, suffix: str = "", profile: str = DEFAULT_PROFILE, outpath: str = None
+) -> str:
+    """Fetch an archive and convert it into h5
+
+    Args:
+        src      (str): source path of the raw zip file
+        suffix   (str): suffix of the output file name
+        profile  (str): storage profile (see `jpxlab.storage.PROFILES`)
+        outpath  (str): output file name (next to `src` with `suffix` by default)
+    Returns:
+        filename (str)
+    """
+
+    outpath = outpath or _get_outpath(src, suffix)
+    mode = os.path.splitext(src)[-1].replace(".", "")
+
+    date = _extract_date(src)
+
+    _stream_convert(src, outpath, mode, date, get_profile(profile))
+
+    return outpath
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""Parser for the FLEX Historical stream
+
+This module only depends on the standard library, so it can be imported
+without paying for numpy, pandas or PyTables.
+"""
+import struct
+from collections import Counter
+from io import BytesIO
+
+
+def _load_chunk(stream: BytesIO) -> tuple:
+    """Load the entire chunk and parse the header in the FLEX stream
+
+    The detailed explanation can be found in 5.3.2 of
+    `01_Market Information System FLEX Connection Specification Common Items DS.15.10.pdf`.
+
+    Args:
+        stream (BytesIO)  : input stream
+
+    Returns:
+        (
+            payload,    # payload of the chunk
+            exchange,   # exchange code
+            session,    # session code
+            category,   # category code
+            security    # security code
+        )
+    """
+
+    fmt_header = "1c6s11s3s1c2s4s12s1c"
+    size_header = struct.calcsize(fmt_header)
+
+    buf = stream.read(size_header)
+    if len(buf) < size_header:
+        return None
+
+    # Extract the header
+    header = struct.unpack(fmt_header, buf)
+    (_, chunk_size, _, _, exchange, session, category, security, _) = header
+    chunk_size = int(chunk_size)
+
+    # Read a block
+    payload = stream.read(chunk_size - size_header).strip(b"\x11")
+    exchange = exchange.strip().decode("utf-8")
+    security = security.strip().decode("utf-8")
+
+    return (payload, exchange, session, category, security, chunk_size)
+
+
+def _parse_chunk(
+    payload: bytes, date_offset_epoch: int, counters: Counter = None
+) -> tuple:
+    """Parse the chunk and yields for each tag
+
+    Extract `4P` and `VL` tags. Detailed explanations can be found in
+
+    "04_Market Information System FLEX Connection Specification Index¥Statistics group DS.15.10.pdf"
+
+    Tags which are not yielded are counted in `counters` when given:
+
+    * `skipped`  : prices with the closing flag set
+    * `no_trade` : prices without current price
+    * `invalid`  : tags which cannot be parsed (these are dropped)
+
+    Args:
+        payload     (str)     : payload of the chunk
+        date_offset (int)     : base date offet in epoch
+        counters    (Counter) : counters of the dropped tags
+    """
+
+    if counters is None:
+        counters = Counter()
+
+    # Define block formats
+    fmt_4p = "2s2s1b14s1c6s1c1c1c14s1c6s1c1c1c14s1c6s1c1c14s1c12s1c2s1c"
+    fmt_vl = "2s2s1c1c14s6s1c"
+
+    # Loop through the Tags (divided by b'\x13')
+    for c in payload.split(b"\x13"):
+
+        tag_id = c[0:2]
+
+        # Check if it is a Price block
+        if tag_id == b"4P":
+            try:
+                val_4p = struct.unpack(fmt_4p, c)
+            except struct.error:
+                counters["invalid"] += 1
+                continue
+            (
+                _,
+                _,
+                o_flag,
+                o_price,
+                o_sign,
+                o_timestamp,
+                o_changed,
+                h_stop,
+                h_flag,
+                h_price,
+                h_sign,
+                h_timestamp,
+                h_changed,
+                l_stop,
+                l_flag,
+                l_price,
+                l_sign,
+                l_timestamp,
+                l_changed,
+                cur_flag,
+                cur_price,
+                cur_sign,
+                cur_timestamp,
+                cur_changed,
+                _,
+                closing_flag,
+            ) = val_4p
+
+            # skip invalid price
+            if closing_flag == b'1':
+                counters["skipped"] += 1
+                continue
+
+            if len(cur_timestamp.strip()) > 0:
+                h, m, s, ms = list(struct.unpack("2s2s2s6s", cur_timestamp))
+
+                try:
+                    row = (
+                        (date_offset_epoch + int(h) * 3600 + int(m) * 60 + int(s))
+                        * 1000000
+                        + int(ms),
+                        int(cur_price),
+                        int(cur_flag),
+                    )
+                except ValueError:
+                    counters["invalid"] += 1
+                    continue
+
+                yield (tag_id, row)
+            else:
+                counters["no_trade"] += 1
+
+        # Check if it is a Volumne block
+        elif tag_id == b"VL":
+            try:
+                val_vl = struct.unpack(fmt_vl, c)
+                _, _, _, flag, vol, timestamp, _ = val_vl
+
+                h, m, s = list(struct.unpack("2s2s2s", timestamp))
+
+                row = (
+                    (date_offset_epoch + int(h) * 3600 + int(m) * 60 + int(s))
+                    * 1000000,
+                    int(vol),
+                )
+            except (struct.error, ValueError):
+                counters["invalid"] += 1
+                continue
+
+            yield (tag_id, row)
+
+        else:
+            # we don't need other chunks
+            pass
+
+
+def _get_security_code(exchange: str, security: str) -> str:
+    """Combine the exchange code and the security code
+    """
+    m = {
+        "1": "t",  # Tokyo Stock Exchange
+        "3": "n",  # Nagoya Stock Exchange
+        "6": "f",  # Fukuoka Stock Exchange
+        "8": "s",  # Sapporo Stock Exchange
+    }
+    if exchange not in m:
+        raise ValueError("Unknown Exchange code", exchange)
+    return m.get(exchange) + security
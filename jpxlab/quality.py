@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+"""Data-quality counters computed while converting
+
+The converter keeps cheap counters while it streams and stores them as
+attributes prefixed with `quality_`:
+
+* each tick node gets the counters of its timestamps (`_TickQuality`), and
+  the price node of a security (or the volume node if it has no prices)
+  gets the counters of its tags (see `jpxlab.flex._parse_chunk`),
+* the root group gets the summary of the file.
+
+Screening days is then a metadata read (see `read_quality`).
+"""
+from collections import Counter
+
+import numpy as np
+import tables
+
+
+ATTR_PREFIX = "quality_"
+
+# counters of the tags, per security (file totals also count unknown exchanges)
+TAG_COUNTERS = ("chunks", "skipped", "no_trade", "invalid", "missing_vl")
+
+# consecutive ticks further apart than this are counted as a gap
+GAP_THRESHOLD_US = 5 * 60 * 1000000
+
+# midday break between the morning and afternoon sessions (11:30-12:30),
+# in us from the origin of the day; it is not counted in the gaps
+LUNCH_BREAK_US = (690 * 60 * 1000000, 750 * 60 * 1000000)
+
+# timestamps are buffered and folded into the counters in batches
+_FOLD_SIZE = 4096
+
+
+class _TickQuality:
+    """Counters of the timestamps of one tick node
+
+    Args:
+        origin (int) : epoch of the day in us, origin of the minute index
+    """
+
+    def __init__(self, origin: int = 0):
+        self.origin = origin
+        self.buffer = []
+        self.last = None
+        self.ticks = 0
+        self.out_of_order = 0
+        self.gaps = 0
+        self.max_gap = 0
+        self.minutes = Counter()
+
+    def add(self, time: int):
+        self.buffer.append(time)
+        if len(self.buffer) >= _FOLD_SIZE:
+            self._fold()
+
+    def _fold(self):
+        """Fold the buffered timestamps into the counters"""
+
+        if len(self.buffer) == 0:
+            return
+
+        times = np.array(self.buffer, dtype=np.int64)
+        self.buffer = []
+
+        if self.last is None:
+            prev = times[:-1]
+            cur = times[1:]
+        else:
+            prev = np.concatenate([[self.last], times[:-1]])
+            cur = times
+        self.last = int(times[-1])
+
+        diffs = cur - prev
+        self.ticks += len(times)
+        self.out_of_order += int(np.count_nonzero(diffs < 0))
+        if len(diffs) > 0:
+            # time spent in the midday break is not trading time
+            start, end = (self.origin + t for t in LUNCH_BREAK_US)
+            lunch = np.minimum(cur, end) - np.maximum(prev, start)
+            diffs = diffs - np.clip(lunch, 0, None)
+            self.gaps += int(np.count_nonzero(diffs > GAP_THRESHOLD_US))
+            self.max_gap = max(self.max_gap, int(diffs.max()))
+
+        minutes, counts = np.unique(
+            (times - self.origin) // 60000000, return_counts=True
+        )
+        self.minutes.update(dict(zip(minutes.tolist(), counts.tolist())))
+
+    def summary(self) -> dict:
+        """Counters to be stored as node attributes"""
+
+        self._fold()
+        minutes = sorted(self.minutes)
+
+        return {
+            "ticks": self.ticks,
+            "out_of_order": self.out_of_order,
+            "gaps": self.gaps,
+            "max_gap_us": self.max_gap,
+            # sparse histogram: minutes of the day with ticks, and their counts
+            "minutes": np.array(minutes, dtype=np.int64),
+            "ticks_per_minute": np.array(
+                [self.minutes[m] for m in minutes], dtype=np.int64
+            ),
+        }
+
+
+def _set_attrs(attrs: tables.attributeset.AttributeSet, counters: dict):
+    for name, value in counters.items():
+        attrs[ATTR_PREFIX + name] = value
+
+
+def _get_attrs(attrs: tables.attributeset.AttributeSet) -> dict:
+    counters = dict()
+    for name in attrs._f_list("user"):
+        if name.startswith(ATTR_PREFIX):
+            value = attrs[name]
+            if isinstance(value, np.generic):
+                value = value.item()
+            counters[name[len(ATTR_PREFIX):]] = value
+    return counters
+
+
+def read_quality(path: str) -> dict:
+    """Read the data-quality counters of a converted file
+
+    Only the attributes are read, not the ticks.
+
+    Args:
+        path (str) : converted h5 file
+    Returns:
+        {
+            "summary": counters of the file,
+            "nodes": {node path: counters of the node},
+        }
+    """
+
+    with tables.open_file(path, mode="r") as store:
+        nodes = dict()
+        for where in ("/price", "/volume"):
+            if where in store:
+                for node in store.list_nodes(where):
+                    nodes[node._v_pathname] = _get_attrs(node.attrs)
+
+        return {"summary": _get_attrs(store.root._v_attrs), "nodes": nodes}
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+"""Resample converted h5 files into aggregated dataframes"""
+import numpy as np
+import pandas as pd
+import tables
+from tqdm import tqdm
+
+from .storage import (
+    DEFAULT_PROFILE,
+    PRICE_COLUMNS,
+    PRICE_FLAG_COLUMNS,
+    VOLUME_COLUMNS,
+    get_profile,
+)
+
+
+def _read_ticks(node, columns: list) -> np.ndarray:
+    """Read a tick node into a preallocated structured buffer
+
+    Tables are read straight into the buffer. The 2-D arrays written by
+    older versions of the converter (all int64) are viewed as `columns`
+    without a copy. Delta-encoded timestamps are accumulated in place.
+
+    Args:
+        node          : price or volume node
+        columns (list): dtype description of the rows of an array node
+    Returns:
+        structured array with one field per column
+    """
+
+    if isinstance(node, tables.Table):
+        data = np.empty(node.nrows, dtype=node.dtype)
+        node.read(out=data)
+    else:
+        data = node.read().view(np.dtype(columns)).reshape(-1)
+
+    if getattr(node.attrs, "time_encoding", None) == "delta":
+        np.cumsum(data["time"], out=data["time"])
+
+    return data
+
+
+def _to_series(data: np.ndarray, values: np.ndarray, name: str) -> pd.Series:
+    """Build a Series on `values` indexed by the time column of `data`"""
+
+    index = pd.DatetimeIndex(data["time"].view("datetime64[us]"), name="time")
+    return pd.Series(values, index=index, name=name, copy=False)
+
+
+def _extract_prices(node):
+    """Extract the sequence of prices and return as a Series
+
+    The integer prices are divided by their decimal scale into a float64
+    view of the same buffer.
+    """
+
+    if "price_scale" in node.attrs:
+        data = _read_ticks(node, PRICE_COLUMNS)
+        fixed = 10.0 ** node.attrs.price_scale
+    else:
+        data = _read_ticks(node, PRICE_FLAG_COLUMNS)
+        fixed = 10.0 ** data["flag"]
+
+    # apply decimal points, in place: the int64 "price" field of `data` holds
+    # float64 values afterwards and must not be read anymore
+    price = data["price"]
+    current = price.view(np.float64)
+    np.divide(price, fixed, out=current)
+
+    series = _to_series(data, current, "current")
+    if not series.index.is_monotonic_increasing:
+        series = series.sort_index()
+
+    return series
+
+
+def _extract_volumes(node):
+    """Extract the sequence of volumes and return as a Series
+
+    The volume column is recorded as cumulative volume, so it has to be
+    digitized by taking diff (in place, the first volume is kept as is).
+    """
+
+    data = _read_ticks(node, VOLUME_COLUMNS)
+
+    # calc delta
+    volume = data["volume"]
+    volume[1:] -= volume[:-1]
+
+    return _to_series(data, volume, "volume")
+
+
+def _resample_ohlc(price, volume, freq):
+    return pd.concat([
+        price.resample(freq).ohlc(),
+        volume.resample(freq).sum().to_frame("volume"),
+        (price * volume.values).resample(freq).sum().to_frame("amount"),
+    ], axis=1)
+
+
+def resample(src: str, outpath: str, freq: str, profile: str = DEFAULT_PROFILE):
+    """Resample raw h5 file
+
+    Args:
+        src     (str): source file name
+        outpath (str): output file name
+        freq    (str): frequency of resampling
+        profile (str): storage profile (see `jpxlab.storage.PROFILES`)
+    """
+
+    profile = get_profile(profile)
+
+    with pd.HDFStore(
+        outpath, mode="w", complevel=profile.complevel, complib=profile.complib
+    ) as writer, tables.open_file(src, mode="r") as reader:
+
+        for group in reader.root._f_walk_groups():
+
+            if group._v_name == "price":
+                for node_prices in tqdm(
+                    group._f_list_nodes(),
+                    desc="Resampling",
+                    unit=" Securities",
+                    ncols=100,
+                ):
+                    # combine prices and volumes
+                    node_volumes = reader.get_node(
+                        node_prices._v_pathname.replace("price", "volume")
+                    )
+
+                    # resample
+                    df = _resample_ohlc(
+                        _extract_prices(node_prices),
+                        _extract_volumes(node_volumes),
+                        freq)
+
+                    writer.put(key=node_prices._v_name, value=df)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+"""Storage profiles for the tick and bar files
+
+A profile decides how the converter lays out the tick nodes and which
+PyTables filter is applied to both the tick and the bar files.
+
+The tick nodes are tables with typed columns (see `_get_description`).
+With `encoded=True` they hold
+
+* delta-encoded timestamps (`time_encoding` node attribute), and
+* integer prices sharing one decimal scale per node (`price_scale` node
+  attribute), so that the per-row decimal flag column is dropped.
+
+This module is imported by the command line, so PyTables is only loaded
+when the filters are actually built.
+"""
+from collections import namedtuple
+
+
+StorageProfile = namedtuple(
+    "StorageProfile", ["complib", "complevel", "shuffle", "encoded"]
+)
+
+PROFILES = {
+    # raw columns of the parser, no compression
+    "none": StorageProfile(complib=None, complevel=0, shuffle=False, encoded=False),
+    # encoded layout, best ratio but slow to write and read
+    "zlib": StorageProfile(complib="zlib", complevel=9, shuffle=True, encoded=True),
+    # encoded layout, fast compressors
+    "lz4": StorageProfile(complib="blosc:lz4", complevel=5, shuffle=True, encoded=True),
+    "zstd": StorageProfile(
+        complib="blosc:zstd", complevel=5, shuffle=True, encoded=True
+    ),
+}
+
+DEFAULT_PROFILE = "lz4"
+
+# Columns of the tick tables, as numpy dtype descriptions
+PRICE_COLUMNS = [("time", "<i8"), ("price", "<i8")]
+PRICE_FLAG_COLUMNS = PRICE_COLUMNS + [("flag", "<i8")]
+VOLUME_COLUMNS = [("time", "<i8"), ("volume", "<i8")]
+
+
+def get_profile(profile) -> StorageProfile:
+    """Resolve a storage profile
+
+    Args:
+        profile (str or StorageProfile) : name in `PROFILES` or a profile
+    Returns:
+        StorageProfile
+    """
+    if isinstance(profile, StorageProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError("Unknown storage profile", profile)
+    return PROFILES[profile]
+
+
+def _get_filters(profile: StorageProfile):
+    """Build the PyTables filters of the profile (None if uncompressed)"""
+    import tables
+
+    if profile.complevel == 0 or profile.complib is None:
+        return None
+
+    return tables.Filters(
+        complevel=profile.complevel,
+        complib=profile.complib,
+        shuffle=profile.shuffle,
+    )
+
+
+def _get_description(where: str, profile: StorageProfile) -> list:
+    """Columns of the tick table stored under `where` ("/price" or "/volume")"""
+
+    if where == "/volume":
+        return VOLUME_COLUMNS
+    if where == "/price":
+        return PRICE_COLUMNS if profile.encoded else PRICE_FLAG_COLUMNS
+    raise ValueError("Unknown tick group", where)
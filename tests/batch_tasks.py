@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Task functions registered in `jpxlab.batch.TASKS` by `tests/test_batch.py`."""
+import os
+import time
+
+from jpxlab.batch import _staged
+
+
+def touch(path, stage=None):
+    """Write the name of `path` into `<path>.out`"""
+
+    out = path + ".out"
+    with open(_staged(out, stage), "w") as f:
+        f.write(os.path.basename(path))
+
+    return {"out": out}
+
+
+def sleep(seconds, stage=None):
+    time.sleep(seconds)
+
+    return {}
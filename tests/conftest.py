@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Fixtures shared by the tests of `jpxlab`."""
+import pytest
+import tables
+
+from jpxlab.converter import _TickWriter
+
+
+def _write_ticks(path, profile, prices, volumes, key=("1", "1234")):
+    """Write the ticks of one security as the converter does"""
+
+    name = "t" + key[1]
+    with tables.open_file(path, mode="w") as store:
+        out_price = _TickWriter(store, "/price", profile)
+        out_volume = _TickWriter(store, "/volume", profile)
+        for row in prices:
+            out_price.append(key, name, row)
+        for row in volumes:
+            out_volume.append(key, name, row)
+        out_price.close()
+        out_volume.close()
+
+
+@pytest.fixture
+def write_ticks():
+    return _write_ticks
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `jpxlab.batch`."""
+import pytest
+import json
+import os
+import subprocess
+import sys
+import time
+
+from jpxlab import batch
+from jpxlab.storage import PROFILES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# tasks of `batch_tasks`, registered next to the tasks of the package
+TEST_TASKS = {"touch": "batch_tasks:touch", "sleep": "batch_tasks:sleep"}
+
+
+@pytest.fixture(autouse=True)
+def test_tasks(monkeypatch):
+    monkeypatch.syspath_prepend(HERE)
+    for kind, path in TEST_TASKS.items():
+        monkeypatch.setitem(batch.TASKS, kind, path)
+
+
+def _spawn_worker(queue, **kwargs):
+    code = (
+        "import sys; sys.path.insert(0, {!r})\n"
+        "from jpxlab import batch\n"
+        "batch.TASKS.update({!r})\n"
+        "batch.work(sys.argv[1], **{!r})"
+    ).format(HERE, TEST_TASKS, kwargs)
+    return subprocess.Popen([sys.executable, "-c", code, queue])
+
+
+def test_submit(tmpdir):
+    queue = str(tmpdir)
+
+    ids = batch.submit(queue, "convert", ["/data/a.zip", "/data/b.zip"], profile="lz4")
+    assert len(set(ids)) == 2
+    assert ids[0].startswith("convert-a.zip-")
+
+    # resubmitting is a no-op
+    assert batch.submit(queue, "convert", ["/data/a.zip"], profile="lz4") == ids[:1]
+    with open(os.path.join(queue, "tasks", ids[0] + ".json")) as f:
+        task = json.load(f)
+    assert task["args"] == ["/data/a.zip"]
+    assert task["kwargs"] == {"profile": "lz4"}
+
+    with pytest.raises(ValueError):
+        batch.submit(queue, "unknown", ["/data/a.zip"])
+    with pytest.raises(ValueError):
+        batch.submit(queue, "os:system", ["echo"])
+
+
+def test_work_runs_only_known_tasks(tmpdir):
+    queue = str(tmpdir.join("queue"))
+    out = str(tmpdir.join("out"))
+    batch.init_queue(queue)
+    # a task file written by hand on the shared directory
+    batch._write_json(
+        batch._path(queue, "tasks", "evil"),
+        {"id": "evil", "kind": "os:system", "args": ["touch " + out], "kwargs": {}},
+    )
+
+    assert batch.work(queue, worker="w1", poll=0.01) == 1
+
+    result = batch.merge(queue)["results"]["evil"]
+    assert result["status"] == "failed"
+    assert "Unknown task kind" in result["error"]
+    assert not os.path.exists(out)
+
+
+def test_submit_other_arguments(tmpdir):
+    queue = str(tmpdir)
+
+    (a1,) = batch.submit(queue, "resample", ["/a/x.h5"], freq="1min")
+    (a5,) = batch.submit(queue, "resample", ["/a/x.h5"], freq="5min")
+    (b1,) = batch.submit(queue, "resample", ["/b/x.h5"], freq="1min")
+
+    assert len({a1, a5, b1}) == 3
+    assert len(os.listdir(os.path.join(queue, "tasks"))) == 3
+    with open(os.path.join(queue, "tasks", a5 + ".json")) as f:
+        assert json.load(f)["kwargs"] == {"freq": "5min"}
+
+
+def test_task_id_is_a_safe_file_name():
+    task_id = batch._task_id("os.path:basename", "/data/[a]*?.zip", {})
+
+    assert task_id.startswith("os.path_basename-_a___.zip-")
+    assert os.sep not in task_id
+
+
+def test_requeues_are_counted_per_task(tmpdir):
+    queue = str(tmpdir)
+    a, ab = batch.submit(queue, "touch", ["a", "a.b"])
+
+    assert batch._claim(queue, ab, "dead")
+    os.utime(batch._path(queue, "leases", ab), (0, 0))
+    assert batch._reap(queue, 10, "w1") == [ab]
+
+    assert batch._requeues(queue, ab) == 1
+    assert batch._requeues(queue, a) == 0
+
+
+def test_work(tmpdir):
+    queue = str(tmpdir.join("queue"))
+    items = [str(tmpdir.join("a.zip")), str(tmpdir.join("b.zip"))]
+    a, b = batch.submit(queue, "touch", items)
+
+    assert batch.work(queue, worker="w1", poll=0.01) == 2
+    assert os.listdir(os.path.join(queue, "leases")) == []
+
+    summary = batch.merge(queue)
+    assert summary["tasks"] == 2
+    assert summary["done"] == 2
+    assert summary["pending"] == 0
+    assert summary["workers"]["w1"]["tasks"] == 2
+    assert summary["results"][a]["value"] == {"out": items[0] + ".out"}
+    assert os.path.exists(os.path.join(queue, "summary.json"))
+    assert sorted(os.listdir(str(tmpdir))) == ["a.zip.out", "b.zip.out", "queue"]
+    with open(items[0] + ".out") as f:
+        assert f.read() == "a.zip"
+
+    # nothing left to do
+    assert batch.work(queue, worker="w2", poll=0.01) == 0
+
+
+def test_work_failed_task(tmpdir):
+    queue = str(tmpdir)
+    (task_id,) = batch.submit(queue, "touch", ["/nonexistent/a.zip"])
+
+    batch.work(queue, poll=0.01)
+
+    summary = batch.merge(queue)
+    assert summary["failed"] == 1
+    assert "FileNotFoundError" in summary["results"][task_id]["error"]
+
+
+def test_requeue_dead_worker(tmpdir):
+    queue = str(tmpdir.join("queue"))
+    item = str(tmpdir.join("a.zip"))
+    (task_id,) = batch.submit(queue, "touch", [item])
+
+    # a lease and a staging file left behind by a dead worker
+    assert batch._claim(queue, task_id, "dead", "s")
+    lease = batch._path(queue, "leases", task_id)
+    os.utime(lease, (time.time() - 60, time.time() - 60))
+    partial = batch._staged(item + ".out", "s")
+    open(partial, "w").close()
+
+    assert batch.work(queue, worker="w1", lease_timeout=10, heartbeat=1, poll=0.01) == 1
+
+    result = batch.merge(queue)["results"][task_id]
+    assert result["worker"] == "w1"
+    assert result["metrics"]["attempt"] == 2
+    assert not os.path.exists(partial)
+    assert sorted(os.listdir(str(tmpdir))) == ["a.zip.out", "queue"]
+
+
+def test_abandon_after_requeues(tmpdir):
+    queue = str(tmpdir)
+    (task_id,) = batch.submit(queue, "sleep", [0])
+
+    for _ in range(2):
+        assert batch._claim(queue, task_id, "dead")
+        os.utime(batch._path(queue, "leases", task_id), (0, 0))
+        assert batch._reap(queue, 10, "w1") == [task_id]
+
+    batch.work(queue, worker="w1", lease_timeout=10, heartbeat=1, max_requeues=2)
+
+    result = batch.merge(queue)["results"][task_id]
+    assert result["status"] == "failed"
+    assert "abandoned" in result["error"]
+
+
+def test_fresh_lease_is_kept(tmpdir):
+    queue = str(tmpdir)
+    (task_id,) = batch.submit(queue, "sleep", [0])
+    assert batch._claim(queue, task_id, "alive")
+
+    assert batch._reap(queue, 10, "w1") == []
+    assert batch._owns(queue, task_id, "alive")
+
+
+def test_outputs_of_a_lost_lease_are_discarded(tmpdir, write_ticks):
+    queue = str(tmpdir.join("queue"))
+    src = str(tmpdir.join("ticks.h5"))
+    bars = str(tmpdir.join("ticks_1s.h5"))
+    write_ticks(
+        src,
+        PROFILES["lz4"],
+        [(i * 1000000, 2038, 0) for i in range(3)],
+        [(i * 1000000, 100 * i) for i in range(3)],
+    )
+    (task_id,) = batch.submit(queue, "resample", [src], freq="1s")
+
+    # worker A runs the task, but its lease is taken back meanwhile
+    assert batch._claim(queue, task_id, "A", "a")
+    task = batch._read_json(batch._path(queue, "tasks", task_id))
+    result = batch._run(queue, task, "A", "a")
+    assert result["status"] == "done"
+    assert os.path.exists(batch._staged(bars, "a"))
+    assert not os.path.exists(bars)
+
+    os.utime(batch._path(queue, "leases", task_id), (0, 0))
+    assert batch._reap(queue, 10, "B") == [task_id]
+    assert not os.path.exists(batch._staged(bars, "a"))
+
+    # A finishes without noticing, nothing is kept
+    assert not batch._commit(queue, result, "A", "a", False)
+    assert not os.path.exists(batch._staged(bars, "a"))
+    assert not os.path.exists(bars)
+
+    assert batch.work(queue, worker="B", heartbeat=1, poll=0.01) == 1
+    assert os.path.exists(bars)
+    assert sorted(os.listdir(str(tmpdir))) == ["queue", "ticks.h5", "ticks_1s.h5"]
+    assert batch.merge(queue)["results"][task_id]["value"] == {"bars": bars}
+
+
+def test_commit_after_the_lease_was_claimed_again(tmpdir):
+    queue = str(tmpdir.join("queue"))
+    item = str(tmpdir.join("a.zip"))
+    (task_id,) = batch.submit(queue, "touch", [item])
+    task = batch._read_json(batch._path(queue, "tasks", task_id))
+
+    # A ran the task, then its lease was reaped and claimed by B
+    result = batch._run(queue, task, "A", "a")
+    assert os.path.exists(batch._staged(item + ".out", "a"))
+    assert batch._claim(queue, task_id, "B", "b")
+
+    assert not batch._commit(queue, result, "A", "a", False)
+    assert batch._owns(queue, task_id, "B")
+    assert sorted(os.listdir(str(tmpdir))) == ["queue"]
+    assert batch._list_ids(queue, "results") == []
+
+
+def test_lease_reaped_from_running_worker(tmpdir):
+    """A worker whose lease is reaped while it runs does not record its result"""
+    queue = str(tmpdir)
+    (task_id,) = batch.submit(queue, "sleep", [1.0])
+
+    a = _spawn_worker(queue, worker="A", lease_timeout=60, heartbeat=0.05, poll=0.05)
+    lease = batch._path(queue, "leases", task_id)
+    deadline = time.time() + 10
+    while not os.path.exists(lease) and time.time() < deadline:
+        time.sleep(0.01)
+
+    # B considers A's lease stale as soon as it misses a heartbeat
+    b = _spawn_worker(
+        queue, worker="B", lease_timeout=0.02, heartbeat=0.005, poll=0.005
+    )
+    assert a.wait(timeout=30) == 0
+    assert b.wait(timeout=30) == 0
+
+    result = batch.merge(queue)["results"][task_id]
+    assert result["worker"] == "B"
+    assert result["metrics"]["attempt"] == 2
+    assert batch._requeues(queue, task_id) == 1
+    assert os.listdir(os.path.join(queue, "leases")) == []
+
+
+def test_heartbeat_keeps_lease(tmpdir):
+    """A task running longer than the lease timeout is not requeued"""
+    queue = str(tmpdir)
+    (task_id,) = batch.submit(queue, "sleep", [1.0])
+
+    workers = [
+        _spawn_worker(queue, lease_timeout=0.5, heartbeat=0.05, poll=0.05)
+        for _ in range(2)
+    ]
+    for w in workers:
+        assert w.wait(timeout=30) == 0
+
+    summary = batch.merge(queue)
+    assert summary["done"] == 1
+    assert summary["results"][task_id]["metrics"]["attempt"] == 1
+    assert os.listdir(os.path.join(queue, "requeued")) == []
+
+
+def test_multiple_workers(tmpdir):
+    queue = str(tmpdir)
+    ids = batch.submit(queue, "sleep", [0.1 + i / 1000 for i in range(12)])
+
+    workers = [_spawn_worker(queue, poll=0.05) for _ in range(3)]
+    for w in workers:
+        assert w.wait(timeout=30) == 0
+
+    summary = batch.merge(queue)
+    assert sorted(summary["results"]) == sorted(ids)
+    assert summary["done"] == len(ids)
+    assert sum(w["tasks"] for w in summary["workers"].values()) == len(ids)
+    assert len(summary["workers"]) > 1
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Import-time regression tests for `jpxlab` package.
+
+Each check runs a fresh interpreter, so that modules already loaded by
+pytest do not hide a regression. The time budgets rely on `-X importtime`,
+which is only available from Python 3.7.
+"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+# Budgets in microseconds (cumulative import time of the entry module)
+IMPORT_BUDGET_US = 50000
+CLI_HELP_BUDGET_US = 150000
+
+HEAVY_MODULES = ("numpy", "pandas", "tables", "tqdm", "joblib")
+
+CLI_HELP = (
+    "import sys, jpxlab.cli\n"
+    "sys.argv = ['jpxlab', '--help']\n"
+    "try:\n"
+    "    jpxlab.cli.main()\n"
+    "except SystemExit:\n"
+    "    pass\n"
+)
+
+requires_importtime = pytest.mark.skipif(
+    sys.version_info < (3, 7), reason="-X importtime requires Python 3.7"
+)
+
+
+def _modules(code: str) -> list:
+    """Run `code` in a fresh interpreter and return the loaded modules"""
+
+    out = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            code + "\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))",
+        ]
+    )
+
+    return json.loads(out.decode("utf-8").splitlines()[-1])
+
+
+def _importtime(code: str) -> dict:
+    """Run `code` in a fresh interpreter and return the import table
+
+    Returns:
+        {module name: cumulative import time in us}
+    """
+
+    proc = subprocess.Popen(
+        [sys.executable, "-X", "importtime", "-c", code],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    _, err = proc.communicate()
+    assert proc.returncode == 0
+
+    imports = dict()
+    for line in err.decode("utf-8").splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            # header line
+            continue
+        imports[name.strip()] = int(cumulative)
+
+    return imports
+
+
+def _assert_no_heavy_imports(modules):
+    heavy = [name for name in modules if name.split(".")[0] in HEAVY_MODULES]
+    assert heavy == []
+
+
+def test_import_package():
+    _assert_no_heavy_imports(_modules("import jpxlab"))
+
+
+def test_cli_help():
+    _assert_no_heavy_imports(_modules(CLI_HELP))
+
+
+@requires_importtime
+def test_import_package_budget():
+    imports = _importtime("import jpxlab")
+
+    assert imports["jpxlab"] < IMPORT_BUDGET_US
+
+
+@requires_importtime
+def test_cli_help_budget():
+    imports = _importtime(CLI_HELP)
+
+    assert imports["jpxlab.cli"] < CLI_HELP_BUDGET_US
+
+
+def test_flex_parser_is_standalone():
+    _assert_no_heavy_imports(_modules("import jpxlab.flex"))
+
+
+@pytest.mark.parametrize(
+    "module, forbidden",
+    [("jpxlab.resampler", "jpxlab.converter"), ("jpxlab.converter", "pandas")],
+)
+def test_worker_imports_only_its_code_path(module, forbidden):
+    modules = _modules("import {}".format(module))
+
+    assert module in modules
+    assert forbidden not in modules
+
+
+def test_lazy_functions(monkeypatch):
+    import jpxlab
+    from jpxlab import converter, resampler
+
+    monkeypatch.setattr(converter, "fetch_and_convert", lambda *a, **k: (a, k))
+    monkeypatch.setattr(resampler, "resample", lambda *a, **k: (a, k))
+
+    assert jpxlab.fetch_and_convert("a.zip", profile="lz4") == (
+        ("a.zip",),
+        {"profile": "lz4"},
+    )
+    assert jpxlab.resample("a.h5", "b.h5", "1min") == (("a.h5", "b.h5", "1min"), {})
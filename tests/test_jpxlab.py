@@ -5,8 +5,11 @@
 import pytest
 import io
 import datetime
+import tables
+from collections import Counter
 
 from jpxlab import jpxlab
+from jpxlab.quality import read_quality
 
 
 STREAM = (
@@ -123,3 +126,51 @@ def test_get_outpath():
 def test_extract_date():
     dt = jpxlab._extract_date("StandardEquities_20191120.zip")
     assert dt == datetime.datetime(2019, 11, 20, 0, 0)
+
+
+def test_parse_chunk_counters():
+    stream = io.BytesIO(STREAM)
+    payload = jpxlab._load_chunk(stream)[0]
+    tag_4p = [c for c in payload.split(b"\x13") if c.startswith(b"4P")][0]
+
+    # closing flag set, then a truncated VL tag
+    payload = b"\x13".join([tag_4p[:-1] + b"1", b"VL   0   12"])
+
+    counters = Counter()
+    assert list(jpxlab._parse_chunk(payload, 0, counters)) == []
+    assert counters == {"skipped": 1, "invalid": 1}
+
+
+def test_dump_to_h5_quality(tmpdir):
+    # the first chunk again, from an unknown exchange
+    unknown = STREAM[:21] + b"9" + STREAM[22:1295]
+
+    path = str(tmpdir.join("test.h5"))
+    with tables.open_file(path, mode="w") as store:
+        jpxlab._dump_to_h5(
+            io.BytesIO(STREAM + unknown), store, 0, datetime.date(2019, 11, 20)
+        )
+
+    result = read_quality(path)
+
+    summary = result["summary"]
+    assert summary["chunks"] == 4
+    assert summary["unknown_exchange"] == 1
+    assert summary["skipped"] == 0
+    assert summary["missing_vl"] == 0
+    assert summary["securities"] == 2
+    assert summary["price_ticks"] == 3
+    assert summary["volume_ticks"] == 3
+    assert summary["price_out_of_order"] == 0
+
+    prices = result["nodes"]["/price/s9876"]
+    assert prices["chunks"] == 2
+    assert prices["ticks"] == 2
+    assert prices["max_gap_us"] == 6513044
+    # both ticks between 09:00 and 09:01
+    assert list(prices["minutes"]) == [9 * 60]
+    assert list(prices["ticks_per_minute"]) == [2]
+
+    # the tag counters are stored with the prices only
+    assert "chunks" not in result["nodes"]["/volume/s9876"]
+    assert result["nodes"]["/volume/s9876"]["ticks"] == 2
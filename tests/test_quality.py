@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `jpxlab.quality`."""
+import pytest
+import tables
+
+from jpxlab import quality
+
+
+MINUTE = 60000000
+
+TIMES = [
+    11 * 60 * MINUTE + 20 * MINUTE,
+    11 * 60 * MINUTE + 20 * MINUTE + 1000000,
+    11 * 60 * MINUTE + 20 * MINUTE + 500000,  # out of order
+    11 * 60 * MINUTE + 22 * MINUTE,
+    11 * 60 * MINUTE + 29 * MINUTE,  # gap of 7 minutes
+    12 * 60 * MINUTE + 31 * MINUTE,  # lunch break, 2 minutes of trading
+    12 * 60 * MINUTE + 45 * MINUTE,  # gap of 14 minutes
+]
+
+
+@pytest.mark.parametrize("fold_size", [2, 4096])
+def test_tick_quality(monkeypatch, fold_size):
+    monkeypatch.setattr(quality, "_FOLD_SIZE", fold_size)
+
+    counters = quality._TickQuality()
+    for t in TIMES:
+        counters.add(t)
+    summary = counters.summary()
+
+    assert summary["ticks"] == 7
+    assert summary["out_of_order"] == 1
+    assert summary["gaps"] == 2
+    assert summary["max_gap_us"] == 14 * MINUTE
+    assert list(summary["minutes"]) == [680, 682, 689, 751, 765]
+    assert list(summary["ticks_per_minute"]) == [3, 1, 1, 1, 1]
+
+
+@pytest.mark.parametrize("origin", [0, 1574175600 * 1000000])
+def test_lunch_break_is_not_a_gap(origin):
+    counters = quality._TickQuality(origin)
+    for t in [11 * 60 + 29, 12 * 60 + 31]:
+        counters.add(origin + t * MINUTE)
+    summary = counters.summary()
+
+    assert summary["gaps"] == 0
+    assert summary["max_gap_us"] == 2 * MINUTE
+
+
+def test_tick_quality_origin():
+    origin = 1574175600 * 1000000
+
+    counters = quality._TickQuality(origin)
+    counters.add(origin + TIMES[0])
+    summary = counters.summary()
+
+    assert summary["max_gap_us"] == 0
+    assert list(summary["minutes"]) == [680]
+
+
+def test_read_quality(tmpdir):
+    path = str(tmpdir.join("test.h5"))
+    with tables.open_file(path, mode="w") as store:
+        node = store.create_earray("/price", "t1234", obj=[[0, 1]], createparents=True)
+        node.attrs.unrelated = 1
+        quality._set_attrs(node.attrs, {"ticks": 1, "skipped": 2})
+        quality._set_attrs(store.root._v_attrs, {"chunks": 3})
+
+    result = quality.read_quality(path)
+
+    assert result["summary"] == {"chunks": 3}
+    assert result["nodes"] == {"/price/t1234": {"ticks": 1, "skipped": 2}}
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for `jpxlab.storage` and the encoded tick layout."""
+import pytest
+import numpy as np
+import pandas as pd
+import tables
+
+from jpxlab import storage
+from jpxlab.resampler import _extract_prices, _extract_volumes, _read_ticks, resample
+
+
+PRICES = [
+    (1574208000000000, 20380000, 4),
+    (1574208001000000, 2039, 0),
+    (1574208000500000, 20375, 1),
+    (1574208003000000, 203850, 2),
+]
+
+VOLUMES = [
+    (1574208000000000, 1597),
+    (1574208000500000, 1597),
+    (1574208001000000, 1600),
+    (1574208003000000, 1800),
+]
+
+
+def test_get_profile():
+    assert storage.get_profile("lz4") is storage.PROFILES["lz4"]
+
+    profile = storage.StorageProfile("blosc:zstd", 1, True, True)
+    assert storage.get_profile(profile) is profile
+
+    with pytest.raises(ValueError):
+        storage.get_profile("unknown")
+
+
+def test_get_filters():
+    assert storage._get_filters(storage.PROFILES["none"]) is None
+
+    filters = storage._get_filters(storage.PROFILES["zstd"])
+    assert filters.complib == "blosc:zstd"
+    assert filters.shuffle
+
+
+@pytest.mark.parametrize("name", sorted(storage.PROFILES))
+def test_roundtrip(tmpdir, write_ticks, name):
+    path = str(tmpdir.join("ticks.h5"))
+    write_ticks(path, storage.PROFILES[name], PRICES, VOLUMES)
+
+    with tables.open_file(path, mode="r") as store:
+        node_prices = store.get_node("/price/t1234")
+        node_volumes = store.get_node("/volume/t1234")
+
+        assert isinstance(node_prices, tables.Table)
+        assert isinstance(node_volumes, tables.Table)
+
+        if storage.PROFILES[name].encoded:
+            # the scale of the node follows the largest decimal flag
+            assert node_prices.attrs.price_scale == 4
+            assert node_prices.colnames == ["time", "price"]
+            assert node_volumes.attrs.time_encoding == "delta"
+        else:
+            assert node_prices.colnames == ["time", "price", "flag"]
+
+        prices = _read_ticks(node_prices, None)
+        volumes = _read_ticks(node_volumes, None)
+
+        price = _extract_prices(node_prices)
+        volume = _extract_volumes(node_volumes)
+
+    np.testing.assert_array_equal(prices["time"], [row[0] for row in PRICES])
+    np.testing.assert_array_equal(volumes["time"], [row[0] for row in VOLUMES])
+    np.testing.assert_array_equal(volumes["volume"], [row[1] for row in VOLUMES])
+
+    # sorted by time, without float32 rounding
+    assert price.dtype == np.float64
+    assert list(price) == [2038.0, 2037.5, 2039.0, 2038.5]
+    assert list(volume) == [1597, 0, 3, 200]
+    assert list(volume.index) == list(
+        pd.to_datetime([row[0] for row in VOLUMES], unit="us")
+    )
+
+
+def test_rescale(tmpdir, write_ticks):
+    path = str(tmpdir.join("ticks.h5"))
+    write_ticks(path, storage.PROFILES["lz4"], PRICES[1:] + PRICES[:1], VOLUMES)
+
+    with tables.open_file(path, mode="r") as store:
+        node_prices = store.get_node("/price/t1234")
+        assert node_prices.attrs.price_scale == 4
+        price = _extract_prices(node_prices)
+
+    assert list(price) == [2038.0, 2037.5, 2039.0, 2038.5]
+
+
+def test_extract_from_earray(tmpdir):
+    """Files written before the table layout hold 2-D int64 arrays"""
+
+    path = str(tmpdir.join("ticks.h5"))
+    with tables.open_file(path, mode="w") as store:
+        store.create_earray("/price", "t1234", obj=PRICES, createparents=True)
+        store.create_earray("/volume", "t1234", obj=VOLUMES, createparents=True)
+
+    with tables.open_file(path, mode="r") as store:
+        price = _extract_prices(store.get_node("/price/t1234"))
+        volume = _extract_volumes(store.get_node("/volume/t1234"))
+
+    assert list(price) == [2038.0, 2037.5, 2039.0, 2038.5]
+    assert list(volume) == [1597, 0, 3, 200]
+
+
+@pytest.mark.parametrize("name", ["none", "zstd"])
+def test_resample_profile(tmpdir, write_ticks, name):
+    src = str(tmpdir.join("ticks.h5"))
+    outpath = str(tmpdir.join("bars.h5"))
+    write_ticks(src, storage.PROFILES["lz4"], PRICES, VOLUMES)
+
+    resample(src, outpath, "1s", profile=name)
+
+    with tables.open_file(outpath, mode="r") as store:
+        leaves = list(store.walk_nodes("/t1234", "Leaf"))
+        assert len(leaves) > 0
+        for leaf in leaves:
+            assert leaf.filters.complib == storage.PROFILES[name].complib
+
+    df = pd.read_hdf(outpath, "t1234")
+    assert list(df.columns) == ["open", "high", "low", "close", "volume", "amount"]